@@ -1,8 +1,10 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 import docker
 import git
+import hashlib
 import os
+import re
 import socket
 import uuid
 import zipfile
@@ -13,6 +15,8 @@ from config import Config
 from logger import setup_logger
 from queue_service import DeploymentQueue
 from mongodb_service import MongoDBService
+from log_service import LogService
+from scheduler import tenant_id
 
 # Configure logging
 logger = setup_logger(__name__)
@@ -21,12 +25,87 @@ app = Flask(__name__)
 CORS(app, origins=['https://shurulls.pro'])
 
 # Initialize services
-deployment_queue = DeploymentQueue()
+log_service = LogService()
+deployment_queue = DeploymentQueue(log_service)
 mongodb_service = MongoDBService()
 
 # Prometheus metrics
 REQUEST_COUNT = Counter('api_requests_total', 'Total API requests', ['method', 'endpoint'])
 REQUEST_LATENCY = Histogram('api_request_latency_seconds', 'API request latency')
+DUPLICATE_DEPLOYMENTS = Counter('deploy_duplicates_total', 'Deploy submissions coalesced into an existing deployment', ['reason'])
+
+# Deployments that a duplicate content-based submission is coalesced into
+IN_FLIGHT_STATUSES = ('queued', 'processing')
+
+# Deployment IDs that hold an idempotency key but are not in the queue yet
+pending_deployments = set()
+
+def _hash_key(*parts):
+    return hashlib.sha256('\0'.join(parts).encode('utf-8')).hexdigest()
+
+def _hash_upload(file):
+    """Hash an uploaded file and rewind it so the queue worker can still read it"""
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: file.stream.read(64 * 1024), b''):
+        digest.update(chunk)
+    file.stream.seek(0)
+    return digest.hexdigest()
+
+# Remote URLs accepted for deployment; anything else, e.g. a value starting
+# with '-' that git would parse as an option, never reaches git
+REPOSITORY_URL = re.compile(r'^(https://|ssh://|git@)[^\s]+$')
+
+def _is_valid_repository(repo_url):
+    return isinstance(repo_url, str) and REPOSITORY_URL.match(repo_url) is not None
+
+def _resolve_head(repo_url):
+    """Commit the worker will clone, i.e. the remote's default branch HEAD"""
+    output = git.cmd.Git().ls_remote(repo_url, 'HEAD', kill_after_timeout=Config.GIT_LS_REMOTE_TIMEOUT)
+    return output.split()[0] if output else ''
+
+def _idempotency_key(email, request_data):
+    """Derive the de-duplication key for a submission.
+
+    Returns a ``(key, explicit)`` tuple. An ``Idempotency-Key`` header takes
+    precedence; otherwise the key is derived from the repository's current
+    HEAD commit or the uploaded archive.
+    """
+    header_key = request.headers.get('Idempotency-Key')
+    if header_key:
+        return _hash_key('header', email, header_key), True
+    if 'file' in request_data:
+        return _hash_key('upload', email, _hash_upload(request_data['file'])), False
+    if 'repository' in request_data:
+        try:
+            head = _resolve_head(request_data['repository'])
+        except git.GitCommandError as e:
+            # The clone will report the error; just skip de-duplication
+            logger.warning(f"Could not resolve HEAD of {request_data['repository']}: {str(e)}")
+            return None, False
+        return _hash_key('repository', email, request_data['repository'], head), False
+    return None, False
+
+def _claim_deployment(idempotency_key, explicit, deployment_id, email):
+    """Claim the key for a new deployment.
+
+    Returns ``(deployment_id, status)`` of the existing deployment the
+    submission was coalesced into, or None if ``deployment_id`` now holds the key.
+    Only deployments this process tracks are coalesced into; keys left behind
+    by a restart or a crashed request are taken over.
+    """
+    while True:
+        existing_id = mongodb_service.claim_idempotency_key(idempotency_key, deployment_id, email)
+        if existing_id is None:
+            pending_deployments.add(deployment_id)
+            return None
+        if existing_id in pending_deployments:
+            status = 'queued'
+        else:
+            status = deployment_queue.get_deployment_status(existing_id)['status']
+        if status != 'not_found' and (explicit or status in IN_FLIGHT_STATUSES):
+            return existing_id, status
+        # The earlier deployment has finished or is no longer tracked, so this submission takes over the key
+        mongodb_service.release_idempotency_key(idempotency_key, existing_id)
 
 @app.route('/metrics')
 def metrics():
@@ -43,26 +122,56 @@ def deploy():
             return jsonify({'error': 'Email is required'}), 400
 
         email = request.json['email']
+        request_data = request.files if request.files else request.json
+        if 'repository' in request_data and not _is_valid_repository(request_data['repository']):
+            return jsonify({'error': 'Repository must be an https://, ssh:// or git@ URL'}), 400
         deployment_id = str(uuid.uuid4())
+
+        # Coalesce retries and duplicate submissions into the existing deployment
+        idempotency_key, explicit = _idempotency_key(email, request_data)
+        if idempotency_key:
+            existing = _claim_deployment(idempotency_key, explicit, deployment_id, email)
+            if existing:
+                existing_id, status = existing
+                DUPLICATE_DEPLOYMENTS.labels(reason='header' if explicit else 'content').inc()
+                logger.info(f"Duplicate deployment request for user: {email} coalesced into {existing_id}")
+                return jsonify({
+                    'message': 'Deployment request already received',
+                    'deployment_id': existing_id,
+                    'status': status
+                })
+
         logger.info(f"Received deployment request with ID: {deployment_id} for user: {email}")
 
         deployment_data = {
             'deployment_id': deployment_id,
             'email': email,
-            'request_data': request.files if request.files else request.json
+            # No server-side payment verification exists yet, so every user is scheduled as free
+            'tier': 'free',
+            'request_data': request_data
         }
 
-        # Add deployment to queue
-        deployment_queue.add_deployment(deployment_data)
+        try:
+            # Add deployment to queue
+            deployment_queue.add_deployment(deployment_data)
 
-        # Save initial deployment data to MongoDB
-        mongodb_service.save_deployment({
-            'deployment_id': deployment_id,
-            'email': email,
-            'status': 'queued',
-            'created_at': time.time(),
-            'request_data': str(deployment_data['request_data'])
-        })
+            # Save initial deployment data to MongoDB
+            mongodb_service.save_deployment({
+                'deployment_id': deployment_id,
+                'email': email,
+                'status': 'queued',
+                'tier': deployment_data['tier'],
+                # Maps the hashed metric label back to the user, readable only in Mongo
+                'tenant_id': tenant_id(email),
+                'created_at': time.time(),
+                'request_data': str(deployment_data['request_data'])
+            })
+        except Exception:
+            if idempotency_key:
+                mongodb_service.release_idempotency_key(idempotency_key, deployment_id)
+            raise
+        finally:
+            pending_deployments.discard(deployment_id)
 
         logger.info(f"Deployment {deployment_id} queued successfully")
         return jsonify({
@@ -137,6 +246,54 @@ def get_deployment_status(deployment_id):
         logger.error(f"Error retrieving deployment status: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/deployment/<deployment_id>/logs', methods=['GET'])
+@REQUEST_LATENCY.time()
+def get_deployment_logs(deployment_id):
+    """Return build and container logs, optionally following new output"""
+    REQUEST_COUNT.labels(method='GET', endpoint='/deployment/logs').inc()
+    try:
+        follow = request.args.get('follow', 'false').lower() == 'true'
+        tail = request.args.get('tail', str(Config.LOG_BUFFER_LINES))
+        if not tail.isdigit():
+            return jsonify({'error': 'tail must be a non-negative integer'}), 400
+        tail = min(int(tail), Config.LOG_TAIL_MAX_LINES)
+
+        queue_status = deployment_queue.get_deployment_status(deployment_id)['status']
+        status = queue_status
+        if status == 'not_found':
+            db_status = mongodb_service.get_deployment(deployment_id)
+            if not db_status and not log_service.has_logs(deployment_id):
+                logger.warning(f"Deployment not found: {deployment_id}")
+                return jsonify({'error': 'Deployment not found'}), 404
+            status = (db_status or {}).get('status')
+
+        if queue_status in IN_FLIGHT_STATUSES:
+            # Followers wait for the build output of deployments this process will run
+            log_service.open(deployment_id)
+        elif status == 'completed' and not log_service.has_reader(deployment_id):
+            # No reader is attached, e.g. after an API restart; resume after what is on disk
+            try:
+                container = deployment_queue.docker_client.containers.get(f"api-deployment-{deployment_id}")
+                if container.status == 'running':
+                    log_service.attach_container(deployment_id, container)
+            except docker.errors.NotFound:
+                logger.warning(f"Container not found for deployment {deployment_id}")
+
+        if follow:
+            lines = log_service.follow(deployment_id, tail)
+            return Response(stream_with_context(line + '\n' for line in lines), mimetype='text/plain')
+
+        lines = log_service.tail(deployment_id, tail)
+        return jsonify({
+            'deployment_id': deployment_id,
+            'lines': lines,
+            'count': len(lines)
+        })
+
+    except Exception as e:
+        logger.error(f"Error retrieving deployment logs: {str(e)}")
+        return jsonify({'error': str(e)}), 500
+
 if __name__ == '__main__':
     # Start Prometheus metrics server on port 8000
     start_http_server(8000)
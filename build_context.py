@@ -0,0 +1,86 @@
+import os
+import tarfile
+from threading import Thread
+from docker.utils.build import exclude_paths
+from prometheus_client import Histogram
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+BUILD_CONTEXT_SIZE = Histogram(
+    'build_context_size_bytes',
+    'Size of the build context streamed to the Docker daemon',
+    buckets=(1e5, 1e6, 1e7, 5e7, 1e8, 2.5e8, 5e8, 1e9)
+)
+
+
+class BuildContext:
+    """Streams a filtered tar of a project directory to the Docker daemon.
+
+    Paths matching ``ignore_patterns`` or the project's own ``.dockerignore``
+    are left out. The archive is written by a background thread into a pipe,
+    so it is never held in memory or spooled to disk in full::
+
+        with BuildContext(project_path, patterns) as context:
+            client.images.build(fileobj=context, custom_context=True)
+    """
+
+    def __init__(self, project_path, ignore_patterns=None, dockerfile='Dockerfile'):
+        self.project_path = os.path.abspath(project_path)
+        self.ignore_patterns = list(ignore_patterns or [])
+        self.dockerfile = dockerfile
+        self.size = 0
+        self.error = None
+        self._reader = None
+        self._writer = None
+        self._thread = None
+
+    def __enter__(self):
+        patterns = self.ignore_patterns + self._read_dockerignore()
+        read_fd, write_fd = os.pipe()
+        self._reader = os.fdopen(read_fd, 'rb')
+        self._writer = os.fdopen(write_fd, 'wb')
+        self._thread = Thread(target=self._write_archive, args=(patterns,))
+        self._thread.daemon = True
+        self._thread.start()
+        return self._reader
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # Closing the read end unblocks the writer if the daemon stopped reading early
+        self._reader.close()
+        self._thread.join()
+        BUILD_CONTEXT_SIZE.observe(self.size)
+        logger.info(f"Streamed {self.size} byte build context for {self.project_path}")
+        if self.error is not None:
+            # A truncated context fails the build too; report the underlying cause
+            raise self.error
+
+    def write(self, data):
+        self.size += len(data)
+        return self._writer.write(data)
+
+    def _read_dockerignore(self):
+        dockerignore = os.path.join(self.project_path, '.dockerignore')
+        if not os.path.exists(dockerignore):
+            return []
+        with open(dockerignore) as f:
+            lines = [line.strip() for line in f.read().splitlines()]
+        return [line for line in lines if line and not line.startswith('#')]
+
+    def _write_archive(self, patterns):
+        try:
+            files = sorted(exclude_paths(self.project_path, patterns, dockerfile=self.dockerfile))
+            # Stream mode only needs write(), so the archive can go straight into the pipe
+            with tarfile.open(mode='w|', fileobj=self) as archive:
+                for path in files:
+                    archive.add(os.path.join(self.project_path, path), arcname=path, recursive=False)
+        except BrokenPipeError:
+            logger.warning(f"Docker daemon stopped reading build context for {self.project_path}")
+        except Exception as e:
+            logger.error(f"Failed to stream build context for {self.project_path}: {str(e)}")
+            self.error = e
+        finally:
+            try:
+                self._writer.close()
+            except BrokenPipeError:
+                pass
@@ -7,12 +7,14 @@ class Config:
     # Application directories
     UPLOAD_FOLDER = 'uploads'
     EXTRACT_FOLDER = 'extracted'
+    LOG_FOLDER = 'deployment_logs'
     PORT_RANGE_START = 3000
     PORT_RANGE_END = 4000
     
     # Create required directories
     os.makedirs(UPLOAD_FOLDER, exist_ok=True)
     os.makedirs(EXTRACT_FOLDER, exist_ok=True)
+    os.makedirs(LOG_FOLDER, exist_ok=True)
 
     # Service URLs
     DEPLOYMENT_OVH_URL = os.getenv('VITE_MAJBOORI_BASEURL', 'mongodb://localhost:27017/shurull_api')
@@ -22,7 +24,38 @@ class Config:
     # MongoDB configuration
     MONGODB_URI = os.getenv('MONGODB_URI', 'mongodb://localhost:27017')
     MONGODB_DB = os.getenv('MONGODB_DB', 'shurull_api')
+
+    # Deployment scheduling: builds run on a worker pool shared fairly between users.
+    # Weights are deployments served per round-robin turn and must be at least 1.
+    DEPLOYMENT_WORKERS = int(os.getenv('DEPLOYMENT_WORKERS', 4))
+    TIER_WEIGHTS = {
+        'paid': int(os.getenv('PAID_TIER_WEIGHT', 4)),
+        'free': int(os.getenv('FREE_TIER_WEIGHT', 1))
+    }
+    TIER_MAX_CONCURRENT_BUILDS = {
+        'paid': int(os.getenv('PAID_MAX_CONCURRENT_BUILDS', 2)),
+        'free': int(os.getenv('FREE_MAX_CONCURRENT_BUILDS', 1))
+    }
+
+    # Key for the hashed tenant IDs used as metric labels instead of emails.
+    # Set it in production; when empty a random key is generated per process.
+    TENANT_ID_SECRET = os.getenv('TENANT_ID_SECRET', '')
+
+    # Deployment de-duplication
+    IDEMPOTENCY_KEY_TTL = int(os.getenv('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60))
+    # Seconds to wait for git ls-remote when resolving a repository's HEAD
+    GIT_LS_REMOTE_TIMEOUT = int(os.getenv('GIT_LS_REMOTE_TIMEOUT', 10))
     
+    # Deployment logs: newest lines per deployment kept in memory, older ones
+    # appended to gzip files under LOG_FOLDER in batches
+    LOG_BUFFER_LINES = int(os.getenv('LOG_BUFFER_LINES', 1000))
+    LOG_SPILL_BATCH = int(os.getenv('LOG_SPILL_BATCH', 200))
+    LOG_LINE_MAX_CHARS = 4096
+    # Lines returned by the logs endpoint: LOG_BUFFER_LINES by default, at most LOG_TAIL_MAX_LINES
+    LOG_TAIL_MAX_LINES = int(os.getenv('LOG_TAIL_MAX_LINES', 10000))
+    # Followers are disconnected after this many seconds without new output
+    LOG_FOLLOW_IDLE_TIMEOUT = int(os.getenv('LOG_FOLLOW_IDLE_TIMEOUT', 300))
+
     # Logging configuration
     LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
     LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
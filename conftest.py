@@ -0,0 +1 @@
+# Present so pytest puts the repository root on sys.path for the top-level modules
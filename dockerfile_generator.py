@@ -17,6 +17,15 @@ class DockerfileGenerator:
         with open(os.path.join(project_path, 'Dockerfile'), 'w') as f:
             f.write(dockerfile_content)
 
+    def get_dockerignore_patterns(self, project_path):
+        """Build context exclusions; dependencies are installed inside the image"""
+        common = ['.git', '.hg', '.svn', '**/.DS_Store']
+        patterns = {
+            'node': ['node_modules', '**/node_modules', 'npm-debug.log*', 'coverage', '.nyc_output'],
+            'python': ['venv', '.venv', '**/__pycache__', '**/*.py[cod]', '.pytest_cache', '.mypy_cache', '.tox']
+        }
+        return common + patterns[self.detect_project_type(project_path)]
+
     def get_dockerfile_template(self, project_type):
         templates = {
             'node': '''FROM node:16-alpine
@@ -0,0 +1,323 @@
+import codecs
+import gzip
+import os
+import re
+import time
+from collections import deque
+from datetime import datetime, timezone
+from threading import Condition, Lock, Thread
+from config import Config
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# RFC 3339 timestamp Docker prefixes each line with when logs(timestamps=True)
+DOCKER_TIMESTAMP = re.compile(r'^(\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})(?:\.(\d+))?Z$')
+
+
+def docker_timestamp_to_unix(timestamp):
+    """Convert a Docker log timestamp to a Unix timestamp, or None if it is not one"""
+    match = DOCKER_TIMESTAMP.match(timestamp)
+    if not match:
+        return None
+    seconds = datetime.strptime(match.group(1), '%Y-%m-%dT%H:%M:%S').replace(tzinfo=timezone.utc).timestamp()
+    fraction = float(f"0.{match.group(2)}") if match.group(2) else 0.0
+    return seconds + fraction
+
+
+class LogBuffer:
+    """Bounded in-memory tail of one deployment's build and container logs.
+
+    The newest ``max_lines`` lines stay in a ring buffer. Older lines are
+    appended to a gzip file in batches, each batch written as a complete
+    gzip member so the file stays readable while the deployment runs.
+
+    Container output is read with Docker timestamps. The timestamp of the
+    newest spilled line is kept in ``cursor_path`` so a reader re-attached
+    after a restart resumes right after what is already on disk.
+    """
+
+    def __init__(self, spill_path, cursor_path=None, max_lines=None, spill_batch=None):
+        self.spill_path = spill_path
+        self.cursor_path = cursor_path
+        self.max_lines = max_lines or Config.LOG_BUFFER_LINES
+        self.spill_batch = spill_batch or Config.LOG_SPILL_BATCH
+        self.lines = deque()  # (sequence number, line, Docker timestamp) triples
+        self.pending_spill = []
+        self.pending_cursor = None
+        self.last_seq = 0
+        self.closed = False
+        self.container_id = None
+        self.timestamped = False
+        self._decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self._partial_line = ''
+        self._condition = Condition()
+
+    def write(self, text):
+        """Append a chunk of log output.
+
+        Chunks may end mid-line or mid-character; the unfinished line is
+        held back until its newline arrives.
+        """
+        with self._condition:
+            if self.closed:
+                return
+            if isinstance(text, bytes):
+                text = self._decoder.decode(text)
+            lines = (self._partial_line + text).split('\n')
+            self._partial_line = lines.pop()
+            if len(self._partial_line) > Config.LOG_LINE_MAX_CHARS:
+                # Never hold more than one line's worth of output back
+                lines.append(self._partial_line)
+                self._partial_line = ''
+            for line in lines:
+                self._append_line(line)
+            if len(self.pending_spill) >= self.spill_batch:
+                self._spill()
+            self._condition.notify_all()
+
+    def close(self):
+        """Stop accepting output, persist the full log and wake all followers"""
+        with self._condition:
+            if self.closed:
+                return
+            remainder = self._partial_line + self._decoder.decode(b'', final=True)
+            if remainder:
+                self._append_line(remainder)
+            self._partial_line = ''
+            self.closed = True
+            # Spill copies so followers can still drain the ring buffer
+            for _, line, timestamp in self.lines:
+                self.pending_spill.append(line)
+                if timestamp is not None:
+                    self.pending_cursor = timestamp
+            self._spill()
+            self._condition.notify_all()
+
+    def tail(self, count=None):
+        """Return the last ``count`` lines, or every line when ``count`` is None"""
+        with self._condition:
+            snapshot = self._snapshot()
+        return self._tail_from(snapshot, count)
+
+    def follow(self, count=None, idle_timeout=None, poll_interval=1.0):
+        """Yield the last ``count`` lines, then new lines until the buffer is closed.
+
+        Following also stops after ``idle_timeout`` seconds without output,
+        so followers of a quiet container that have disconnected do not wait
+        forever. Followers that fall further behind than the ring buffer skip
+        the lines that were evicted in the meantime.
+        """
+        idle_timeout = idle_timeout or Config.LOG_FOLLOW_IDLE_TIMEOUT
+        with self._condition:
+            since = self.last_seq
+            snapshot = self._snapshot()
+        for line in self._tail_from(snapshot, count):
+            yield line
+
+        last_output = time.monotonic()
+        while True:
+            with self._condition:
+                self._condition.wait_for(lambda: self.last_seq > since or self.closed, poll_interval)
+                new_lines = [line for seq, line, _ in self.lines if seq > since]
+                since = self.last_seq
+                finished = self.closed
+            for line in new_lines:
+                yield line
+            if new_lines:
+                last_output = time.monotonic()
+            if finished or time.monotonic() - last_output >= idle_timeout:
+                return
+
+    def _snapshot(self):
+        # Spills happen under the lock, so the file size marks a gzip member boundary
+        spilled_size = os.path.getsize(self.spill_path) if os.path.exists(self.spill_path) else 0
+        if self.closed:
+            return [], spilled_size
+        return self.pending_spill + [line for _, line, _ in self.lines], spilled_size
+
+    def _tail_from(self, snapshot, count):
+        # Runs without the lock so disk reads never stall writers
+        in_memory, spilled_size = snapshot
+        if count is not None and count <= len(in_memory):
+            return in_memory[len(in_memory) - count:]
+        older_count = None if count is None else count - len(in_memory)
+        return read_spilled_log(self.spill_path, older_count, spilled_size) + in_memory
+
+    def _append_line(self, line):
+        timestamp = None
+        if self.timestamped:
+            prefix, _, rest = line.partition(' ')
+            if docker_timestamp_to_unix(prefix) is not None:
+                timestamp, line = prefix, rest
+        self.last_seq += 1
+        self.lines.append((self.last_seq, line.rstrip('\r')[:Config.LOG_LINE_MAX_CHARS], timestamp))
+        if len(self.lines) > self.max_lines:
+            self._evict()
+
+    def _evict(self):
+        _, line, timestamp = self.lines.popleft()
+        self.pending_spill.append(line)
+        if timestamp is not None:
+            self.pending_cursor = timestamp
+
+    def _spill(self):
+        if not self.pending_spill:
+            return
+        with gzip.open(self.spill_path, 'at', encoding='utf-8') as f:
+            for line in self.pending_spill:
+                f.write(line + '\n')
+        self.pending_spill = []
+        if self.pending_cursor is not None and self.cursor_path:
+            with open(self.cursor_path, 'w') as f:
+                f.write(self.pending_cursor)
+            self.pending_cursor = None
+
+
+class _PrefixReader:
+    """Read-only view of the first ``limit`` bytes of a file"""
+
+    def __init__(self, f, limit):
+        self._file = f
+        self._remaining = limit
+
+    def read(self, size=-1):
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+
+def read_spilled_log(spill_path, count=None, size=None):
+    """Read the last ``count`` lines of a compressed deployment log.
+
+    ``size`` limits reading to the first ``size`` bytes, i.e. the gzip
+    members that were complete when the caller took its snapshot.
+    """
+    if not os.path.exists(spill_path):
+        return []
+    lines = deque(maxlen=count)
+    with open(spill_path, 'rb') as raw:
+        fileobj = raw if size is None else _PrefixReader(raw, size)
+        with gzip.open(fileobj, 'rt', encoding='utf-8') as f:
+            for line in f:
+                lines.append(line.rstrip('\n'))
+    return list(lines)
+
+
+class LogService:
+    """Collects deployment logs and fans them out to any number of readers.
+
+    Build output is written by the queue worker. Runtime output is read by a
+    single thread per container, however many clients are following it.
+    """
+
+    def __init__(self, log_folder=None):
+        self.log_folder = log_folder or Config.LOG_FOLDER
+        self.buffers = {}
+        self.lock = Lock()
+        os.makedirs(self.log_folder, exist_ok=True)
+        logger.info("Log service initialized")
+
+    def _spill_path(self, deployment_id):
+        return os.path.join(self.log_folder, f"{deployment_id}.log.gz")
+
+    def _cursor_path(self, deployment_id):
+        return os.path.join(self.log_folder, f"{deployment_id}.cursor")
+
+    def _new_buffer(self, deployment_id):
+        return LogBuffer(self._spill_path(deployment_id), self._cursor_path(deployment_id))
+
+    def _read_cursor(self, deployment_id):
+        """Unix timestamp just after the newest container line already on disk"""
+        cursor_path = self._cursor_path(deployment_id)
+        if not os.path.exists(cursor_path):
+            return None
+        with open(cursor_path) as f:
+            since = docker_timestamp_to_unix(f.read().strip())
+        # Docker includes lines at exactly ``since``; skip the one already stored
+        return since + 1e-6 if since is not None else None
+
+    def get_buffer(self, deployment_id):
+        with self.lock:
+            return self.buffers.get(deployment_id)
+
+    def open(self, deployment_id):
+        """Start collecting output for a deployment"""
+        with self.lock:
+            buffer = self.buffers.get(deployment_id)
+            if buffer is None:
+                buffer = self.buffers[deployment_id] = self._new_buffer(deployment_id)
+            return buffer
+
+    def has_logs(self, deployment_id):
+        return self.get_buffer(deployment_id) is not None or os.path.exists(self._spill_path(deployment_id))
+
+    def write(self, deployment_id, text):
+        """Append output to an open buffer; output for closed or deleted deployments is dropped"""
+        buffer = self.get_buffer(deployment_id)
+        if buffer is not None:
+            buffer.write(text)
+
+    def close(self, deployment_id):
+        """Persist a deployment's log and release its in-memory buffer"""
+        with self.lock:
+            buffer = self.buffers.pop(deployment_id, None)
+        if buffer is not None:
+            buffer.close()
+
+    def has_reader(self, deployment_id):
+        buffer = self.get_buffer(deployment_id)
+        return buffer is not None and buffer.container_id is not None
+
+    def attach_container(self, deployment_id, container):
+        """Start the reader thread for a container unless one is already running.
+
+        Reading resumes after the newest container line already spilled to
+        disk, e.g. when re-attaching to a container after an API restart.
+        """
+        with self.lock:
+            buffer = self.buffers.get(deployment_id)
+            if buffer is not None and buffer.container_id == container.id:
+                return
+            if buffer is None:
+                buffer = self.buffers[deployment_id] = self._new_buffer(deployment_id)
+            buffer.container_id = container.id
+            buffer.timestamped = True
+        since = self._read_cursor(deployment_id)
+
+        reader = Thread(target=self._read_container_logs, args=(deployment_id, container, since))
+        reader.daemon = True
+        reader.start()
+        logger.info(f"Started log reader for deployment {deployment_id}")
+
+    def _read_container_logs(self, deployment_id, container, since):
+        try:
+            for chunk in container.logs(stream=True, follow=True, timestamps=True, since=since):
+                self.write(deployment_id, chunk)
+        except Exception as e:
+            logger.error(f"Log reader for deployment {deployment_id} failed: {str(e)}")
+        finally:
+            # The stream ends when the container stops
+            self.close(deployment_id)
+            logger.info(f"Log reader for deployment {deployment_id} finished")
+
+    def tail(self, deployment_id, count=None):
+        buffer = self.get_buffer(deployment_id)
+        if buffer is not None:
+            return buffer.tail(count)
+        return read_spilled_log(self._spill_path(deployment_id), count)
+
+    def follow(self, deployment_id, count=None):
+        buffer = self.get_buffer(deployment_id)
+        if buffer is None:
+            return iter(self.tail(deployment_id, count))
+        return buffer.follow(count)
+
+    def delete(self, deployment_id):
+        """Drop all logs of a deployment"""
+        self.close(deployment_id)
+        for path in (self._spill_path(deployment_id), self._cursor_path(deployment_id)):
+            if os.path.exists(path):
+                os.remove(path)
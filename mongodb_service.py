@@ -1,4 +1,6 @@
+from datetime import datetime
 from pymongo import MongoClient
+from pymongo.errors import DuplicateKeyError
 from config import Config
 from logger import setup_logger
 
@@ -12,6 +14,10 @@ class MongoDBService:
             self.deployments = self.db.deployments
             # Create index on email field for faster queries
             self.deployments.create_index("email")
+            # Idempotency keys map a submission to its deployment and expire via TTL
+            self.idempotency_keys = self.db.idempotency_keys
+            self.idempotency_keys.create_index("key", unique=True)
+            self.idempotency_keys.create_index("created_at", expireAfterSeconds=Config.IDEMPOTENCY_KEY_TTL)
             logger.info("MongoDB connection established")
         except Exception as e:
             logger.error(f"Failed to connect to MongoDB: {str(e)}")
@@ -80,8 +86,45 @@ class MongoDBService:
         """Delete deployment data from MongoDB"""
         try:
             result = self.deployments.delete_one({"deployment_id": deployment_id})
+            # Let future submissions for the same content start a fresh deployment
+            self.idempotency_keys.delete_many({"deployment_id": deployment_id})
             logger.info(f"Deployment deleted from MongoDB: {deployment_id}")
             return result.deleted_count > 0
         except Exception as e:
             logger.error(f"Failed to delete deployment: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    def claim_idempotency_key(self, key, deployment_id, email):
+        """Bind an idempotency key to a deployment.
+
+        Returns None when the key was claimed for ``deployment_id``, or the
+        deployment ID that already holds the key.
+        """
+        try:
+            self.idempotency_keys.insert_one({
+                "key": key,
+                "deployment_id": deployment_id,
+                "email": email,
+                "created_at": datetime.utcnow()
+            })
+            logger.info(f"Idempotency key claimed for deployment: {deployment_id}")
+            return None
+        except DuplicateKeyError:
+            existing = self.idempotency_keys.find_one({"key": key})
+            if existing is None:
+                # The key expired or was released between the insert and the lookup
+                return self.claim_idempotency_key(key, deployment_id, email)
+            return existing['deployment_id']
+        except Exception as e:
+            logger.error(f"Failed to claim idempotency key: {str(e)}")
+            raise
+
+    def release_idempotency_key(self, key, deployment_id):
+        """Release an idempotency key if it is still held by the given deployment"""
+        try:
+            result = self.idempotency_keys.delete_one({"key": key, "deployment_id": deployment_id})
+            logger.info(f"Idempotency key released for deployment: {deployment_id}")
+            return result.deleted_count > 0
+        except Exception as e:
+            logger.error(f"Failed to release idempotency key: {str(e)}")
+            raise
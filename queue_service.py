@@ -1,27 +1,35 @@
-from queue import Queue
+from queue import Empty
 from threading import Thread, Lock
 import time
 from datetime import datetime
 import os
+import re
 import docker
 import git
 import zipfile
 from werkzeug.utils import secure_filename
+from build_context import BuildContext
+from config import Config
 from dockerfile_generator import DockerfileGenerator
+from log_service import LogService
 from logger import setup_logger
 from mongodb_service import MongoDBService
+from scheduler import TenantScheduler
 
 logger = setup_logger(__name__)
 
 class DeploymentQueue:
-    def __init__(self):
-        self.queue = Queue()
+    def __init__(self, log_service=None):
+        self.scheduler = TenantScheduler(Config.TIER_WEIGHTS, Config.TIER_MAX_CONCURRENT_BUILDS)
         self.processing = False
+        # Guards port selection so concurrent workers never pick the same port
         self.lock = Lock()
+        self.reserved_ports = set()
         self.current_deployments = {}
         self.docker_client = docker.from_env()
         self.dockerfile_generator = DockerfileGenerator()
         self.mongodb_service = MongoDBService()
+        self.log_service = log_service or LogService()
         self.upload_folder = 'uploads'
         self.extract_folder = 'extracted'
         self._start_worker()
@@ -29,15 +37,18 @@ class DeploymentQueue:
 
     def _start_worker(self):
         self.processing = True
-        worker = Thread(target=self._process_queue)
-        worker.daemon = True
-        worker.start()
-        logger.info("Queue worker thread started")
+        for _ in range(Config.DEPLOYMENT_WORKERS):
+            worker = Thread(target=self._process_queue)
+            worker.daemon = True
+            worker.start()
+        logger.info(f"Started {Config.DEPLOYMENT_WORKERS} queue worker threads")
 
     def add_deployment(self, deployment_data):
         deployment_id = deployment_data.get('deployment_id')
+        tier = deployment_data.get('tier', 'free')
         status_data = {
             'status': 'queued',
+            'tier': tier,
             'queued_at': datetime.now().isoformat(),
             'started_at': None,
             'completed_at': None,
@@ -46,7 +57,7 @@ class DeploymentQueue:
         }
         
         self.current_deployments[deployment_id] = status_data
-        self.queue.put(deployment_data)
+        self.scheduler.put(deployment_data.get('email'), deployment_data, tier)
         
         # Update MongoDB with initial status
         self.mongodb_service.update_deployment_status(deployment_id, status_data)
@@ -64,7 +75,8 @@ class DeploymentQueue:
             raise ValueError("No file provided")
         
         filename = secure_filename(file.filename)
-        zip_path = os.path.join(self.upload_folder, filename)
+        # Prefix with the deployment ID so concurrent workers never share an archive path
+        zip_path = os.path.join(self.upload_folder, f"{deployment_id}-{filename}")
         extract_path = os.path.join(self.extract_folder, deployment_id)
         
         logger.info(f"Processing file upload for deployment {deployment_id}")
@@ -96,12 +108,10 @@ class DeploymentQueue:
         # Generate Dockerfile based on project type
         self.dockerfile_generator.generate(project_path)
         
-        # Build Docker image
-        image, _ = self.docker_client.images.build(
-            path=project_path,
-            tag=f"api-deployment-{deployment_id}",
-            rm=True
-        )
+        # Build Docker image from a filtered, streamed build context
+        ignore_patterns = self.dockerfile_generator.get_dockerignore_patterns(project_path)
+        with BuildContext(project_path, ignore_patterns) as context:
+            image = self._build_image(context, deployment_id)
         
         logger.info(f"Docker image built successfully for deployment {deployment_id}")
         
@@ -117,12 +127,40 @@ class DeploymentQueue:
             }
         )
         
+        self.log_service.attach_container(deployment_id, container)
+
         logger.info(f"Container started successfully for deployment {deployment_id} on port {port}")
         return container
 
+    def _build_image(self, context, deployment_id):
+        """Build an image, recording the build output in the deployment's log"""
+        image_id = None
+        last_event = None
+        build_stream = self.docker_client.api.build(
+            fileobj=context,
+            custom_context=True,
+            tag=f"api-deployment-{deployment_id}",
+            rm=True,
+            decode=True
+        )
+        for chunk in build_stream:
+            if 'error' in chunk:
+                self.log_service.write(deployment_id, chunk['error'] + '\n')
+                raise docker.errors.BuildError(chunk['error'], [])
+            if 'stream' in chunk:
+                self.log_service.write(deployment_id, chunk['stream'])
+                # Same detection as DockerClient.images.build
+                match = re.search(r'(^Successfully built |sha256:)([0-9a-f]+)$', chunk['stream'])
+                if match:
+                    image_id = match.group(2)
+            last_event = chunk
+        if image_id is None:
+            raise docker.errors.BuildError(last_event or 'Unknown', [])
+        return self.docker_client.images.get(image_id)
+
     def _find_available_port(self, start_port=3000, end_port=4000):
         logger.debug("Searching for available port")
-        used_ports = set()
+        used_ports = set(self.reserved_ports)
         for container in self.docker_client.containers.list():
             if container.ports:
                 for mappings in container.ports.values():
@@ -135,72 +173,93 @@ class DeploymentQueue:
                 logger.info(f"Found available port: {port}")
                 return port
         logger.error("No available ports in the specified range")
-        
+
+    def _reserve_port(self):
+        with self.lock:
+            port = self._find_available_port()
+            if port is not None:
+                self.reserved_ports.add(port)
+            return port
+
+    def _release_port(self, port):
+        with self.lock:
+            self.reserved_ports.discard(port)
+
     def _process_queue(self):
         while self.processing:
             try:
-                if not self.queue.empty():
-                    with self.lock:
-                        deployment_data = self.queue.get()
-                        deployment_id = deployment_data.get('deployment_id')
-                        request_data = deployment_data.get('request_data', {})
-                        
-                        logger.info(f"Processing deployment {deployment_id}")
-                        
-                        # Update status to processing
-                        status_update = {
-                            'status': 'processing',
-                            'started_at': datetime.now().isoformat()
-                        }
-                        self.current_deployments[deployment_id].update(status_update)
-                        self.mongodb_service.update_deployment_status(deployment_id, status_update)
-
-                        try:
-                            # Handle project files
-                            if 'file' in request_data:
-                                project_path = self._handle_file_upload(request_data['file'], deployment_id)
-                            elif 'repository' in request_data:
-                                project_path = self._handle_github_repo(request_data['repository'], deployment_id)
-                            else:
-                                raise ValueError("No file or repository provided")
-
-                            # Find available port
-                            port = self._find_available_port()
-                            
-                            # Build and run container
-                            container = self._build_and_run_container(project_path, deployment_id, port)
-                            
-                            # Update status to completed
-                            status_update = {
-                                'status': 'completed',
-                                'completed_at': datetime.now().isoformat(),
-                                'port': port,
-                                'container_id': container.id
-                            }
-                            self.current_deployments[deployment_id].update(status_update)
-                            self.mongodb_service.update_deployment_status(deployment_id, status_update)
-                            
-                            logger.info(f"Deployment {deployment_id} completed successfully on port {port}")
-                            
-                        except Exception as e:
-                            error_msg = str(e)
-                            logger.error(f"Error processing deployment {deployment_id}: {error_msg}")
-                            
-                            status_update = {
-                                'status': 'failed',
-                                'error': error_msg,
-                                'completed_at': datetime.now().isoformat()
-                            }
-                            self.current_deployments[deployment_id].update(status_update)
-                            self.mongodb_service.update_deployment_status(deployment_id, status_update)
-
-                        self.queue.task_done()
-                else:
-                    time.sleep(1)  # Prevent CPU spinning when queue is empty
-                    
+                email, deployment_data = self.scheduler.get(timeout=1)
+            except Empty:
+                continue  # Wake up periodically to check whether processing stopped
+
+            try:
+                self._process_deployment(deployment_data)
             except Exception as e:
                 logger.error(f"Queue processing error: {str(e)}")
                 time.sleep(1)  # Prevent rapid retries on persistent errors
+            finally:
+                self.scheduler.task_done(email)
+
+    def _process_deployment(self, deployment_data):
+        deployment_id = deployment_data.get('deployment_id')
+        request_data = deployment_data.get('request_data', {})
+
+        logger.info(f"Processing deployment {deployment_id}")
+        self.log_service.open(deployment_id)
+
+        # Update status to processing
+        status_update = {
+            'status': 'processing',
+            'started_at': datetime.now().isoformat()
+        }
+        self.current_deployments[deployment_id].update(status_update)
+        self.mongodb_service.update_deployment_status(deployment_id, status_update)
+
+        port = None
+        try:
+            # Handle project files
+            if 'file' in request_data:
+                project_path = self._handle_file_upload(request_data['file'], deployment_id)
+            elif 'repository' in request_data:
+                project_path = self._handle_github_repo(request_data['repository'], deployment_id)
+            else:
+                raise ValueError("No file or repository provided")
+
+            # Reserve an available port until the container holds it
+            port = self._reserve_port()
+
+            # Build and run container
+            container = self._build_and_run_container(project_path, deployment_id, port)
+
+            # Update status to completed
+            status_update = {
+                'status': 'completed',
+                'completed_at': datetime.now().isoformat(),
+                'port': port,
+                'container_id': container.id
+            }
+            self.current_deployments[deployment_id].update(status_update)
+            self.mongodb_service.update_deployment_status(deployment_id, status_update)
+
+            logger.info(f"Deployment {deployment_id} completed successfully on port {port}")
+
+        except Exception as e:
+            error_msg = str(e)
+            logger.error(f"Error processing deployment {deployment_id}: {error_msg}")
+            self.log_service.write(deployment_id, f"Deployment failed: {error_msg}\n")
+            self.log_service.close(deployment_id)
+
+            status_update = {
+                'status': 'failed',
+                'error': error_msg,
+                'completed_at': datetime.now().isoformat()
+            }
+            self.current_deployments[deployment_id].update(status_update)
+            self.mongodb_service.update_deployment_status(deployment_id, status_update)
+
+        finally:
+            if port is not None:
+                self._release_port(port)
 
     def cleanup_deployment(self, deployment_id):
         """Clean up deployment resources"""
@@ -218,6 +277,9 @@ class DeploymentQueue:
                 import shutil
                 shutil.rmtree(project_path)
             
+            # Remove logs
+            self.log_service.delete(deployment_id)
+
             # Remove from MongoDB
             self.mongodb_service.delete_deployment(deployment_id)
             
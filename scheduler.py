@@ -0,0 +1,128 @@
+import hashlib
+import hmac
+import secrets
+from collections import deque
+from queue import Empty
+from threading import Condition
+from prometheus_client import Gauge
+from config import Config
+from logger import setup_logger
+
+logger = setup_logger(__name__)
+
+# Without a key the HMAC is a plain hash that a list of candidate emails reverses
+if Config.TENANT_ID_SECRET:
+    TENANT_ID_KEY = Config.TENANT_ID_SECRET.encode('utf-8')
+else:
+    TENANT_ID_KEY = secrets.token_bytes(32)
+    logger.warning("TENANT_ID_SECRET is not set; using a random key, so tenant IDs change on every restart")
+
+# Per-tenant scheduler metrics, labelled by tenant_id() since /metrics is public
+TENANT_QUEUE_DEPTH = Gauge('deployment_tenant_queue_depth', 'Deployments waiting in the queue per tenant', ['tenant'])
+TENANT_RUNNING_BUILDS = Gauge('deployment_tenant_running_builds', 'Deployments being built per tenant', ['tenant'])
+
+
+def tenant_id(email):
+    """ID for a user email that cannot be reversed without the key, safe to publish in metrics"""
+    digest = hmac.new(TENANT_ID_KEY, email.encode('utf-8'), hashlib.sha256)
+    return digest.hexdigest()[:16]
+
+
+class _Tenant:
+    def __init__(self, tier):
+        self.tier = tier
+        self.queue = deque()
+        self.deficit = 0
+        self.running = 0
+
+
+class TenantScheduler:
+    """Deficit round-robin scheduler keeping one FIFO queue per tenant.
+
+    Each tenant with waiting work earns its tier's weight in credits per
+    round and spends one credit per deployment handed out, so a tenant that
+    submits a burst cannot starve the others. Tenants already running their
+    tier's maximum number of builds are skipped until a build finishes.
+    """
+
+    def __init__(self, tier_weights, tier_max_running, default_tier='free'):
+        self.tier_weights = tier_weights
+        self.tier_max_running = tier_max_running
+        self.default_tier = default_tier
+        self._tenants = {}
+        self._active = deque()  # Tenants with waiting work, in service order
+        self._condition = Condition()
+
+    def put(self, tenant, item, tier=None):
+        """Queue an item for a tenant. The tenant's latest tier applies."""
+        tier = tier if tier in self.tier_weights else self.default_tier
+        with self._condition:
+            state = self._tenants.get(tenant)
+            if state is None:
+                state = self._tenants[tenant] = _Tenant(tier)
+            state.tier = tier
+            if not state.queue:
+                self._active.append(tenant)
+            state.queue.append(item)
+            self._update_metrics(tenant, state)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """Return the next ``(tenant, item)`` pair, raising ``queue.Empty`` on timeout"""
+        with self._condition:
+            result = self._condition.wait_for(self._next, timeout)
+            if result is None:
+                raise Empty
+            return result
+
+    def task_done(self, tenant):
+        """Mark a tenant's deployment as finished, freeing one of its build slots"""
+        with self._condition:
+            state = self._tenants.get(tenant)
+            if state is None:
+                return
+            state.running -= 1
+            self._update_metrics(tenant, state)
+            if not state.queue and state.running <= 0:
+                del self._tenants[tenant]
+            self._condition.notify_all()
+
+    def _next(self):
+        # A single pass suffices: weights are at least 1, so every eligible
+        # tenant can afford a deployment as soon as it is visited.
+        for _ in range(len(self._active)):
+            tenant = self._active[0]
+            state = self._tenants[tenant]
+            if state.running >= self.tier_max_running.get(state.tier, 1):
+                self._active.rotate(-1)
+                continue
+
+            if state.deficit < 1:
+                state.deficit += self.tier_weights[state.tier]
+            state.deficit -= 1
+            state.running += 1
+            item = state.queue.popleft()
+
+            if not state.queue:
+                self._active.popleft()
+                state.deficit = 0
+            elif state.deficit < 1:
+                self._active.rotate(-1)
+
+            self._update_metrics(tenant, state)
+            logger.debug(f"Scheduled deployment for tenant {tenant} ({state.tier})")
+            return tenant, item
+        return None
+
+    def _update_metrics(self, tenant, state):
+        label = tenant_id(tenant)
+        if state.queue or state.running > 0:
+            TENANT_QUEUE_DEPTH.labels(tenant=label).set(len(state.queue))
+            TENANT_RUNNING_BUILDS.labels(tenant=label).set(state.running)
+        else:
+            # Drop idle tenants so label cardinality tracks active users only
+            for gauge in (TENANT_QUEUE_DEPTH, TENANT_RUNNING_BUILDS):
+                try:
+                    gauge.remove(label)
+                except KeyError:
+                    pass
@@ -0,0 +1,68 @@
+# tests/test_build_context.py
+import tarfile
+
+import pytest
+from prometheus_client import REGISTRY
+
+import build_context
+from build_context import BuildContext
+from dockerfile_generator import DockerfileGenerator
+
+
+@pytest.fixture
+def project(tmp_path):
+    files = {
+        'package.json': '{}',
+        'src/a.js': 'console.log(1)',
+        'secret.txt': 'token',
+        '.git/HEAD': 'ref: refs/heads/main',
+        'node_modules/left-pad/index.js': 'module.exports = 1',
+        'big.bin': 'x' * 200000,
+        '.dockerignore': '# user rules\nsecret.txt\n',
+    }
+    for path, content in files.items():
+        (tmp_path / path).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / path).write_text(content)
+    DockerfileGenerator().generate(str(tmp_path))
+    return tmp_path
+
+
+def patterns(project):
+    return DockerfileGenerator().get_dockerignore_patterns(str(project))
+
+
+def test_context_applies_generated_and_user_ignore_rules(project):
+    with BuildContext(str(project), patterns(project)) as context:
+        names = sorted(member.name for member in tarfile.open(fileobj=context, mode='r|'))
+
+    assert names == ['.dockerignore', 'Dockerfile', 'big.bin', 'package.json', 'src', 'src/a.js']
+
+
+def test_context_size_is_recorded(project):
+    before = REGISTRY.get_sample_value('build_context_size_bytes_count') or 0
+    builder = BuildContext(str(project), patterns(project))
+    with builder as context:
+        streamed = len(context.read())
+
+    assert builder.size == streamed > 200000
+    assert REGISTRY.get_sample_value('build_context_size_bytes_count') == before + 1
+
+
+def test_writer_error_is_raised_on_exit(project, monkeypatch):
+    def fail(*args, **kwargs):
+        raise OSError('unreadable project')
+
+    monkeypatch.setattr(build_context, 'exclude_paths', fail)
+
+    with pytest.raises(OSError, match='unreadable project'):
+        with BuildContext(str(project)) as context:
+            context.read()
+
+
+def test_writer_exits_when_reader_closes_early(project):
+    builder = BuildContext(str(project), patterns(project))
+    with builder as context:
+        context.read(100)
+
+    assert not builder._thread.is_alive()
+    assert builder.error is None
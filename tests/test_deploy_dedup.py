@@ -0,0 +1,171 @@
+# tests/test_deploy_dedup.py
+import hashlib
+import io
+from unittest import mock
+
+import pytest
+from pymongo.errors import DuplicateKeyError
+from werkzeug.datastructures import FileStorage
+
+# app.py connects to Docker and MongoDB at import time
+with mock.patch('docker.from_env'), mock.patch('mongodb_service.MongoClient'):
+    import app
+
+from mongodb_service import MongoDBService
+
+
+class FakeMongoDBService:
+    def __init__(self):
+        self.keys = {}
+        self.saved = []
+
+    def claim_idempotency_key(self, key, deployment_id, email):
+        if key in self.keys:
+            return self.keys[key]
+        self.keys[key] = deployment_id
+        return None
+
+    def release_idempotency_key(self, key, deployment_id):
+        if self.keys.get(key) == deployment_id:
+            del self.keys[key]
+            return True
+        return False
+
+    def save_deployment(self, deployment_data):
+        self.saved.append(deployment_data)
+
+
+class FakeDeploymentQueue:
+    def __init__(self):
+        self.statuses = {}
+        self.fail = False
+
+    def add_deployment(self, deployment_data):
+        if self.fail:
+            raise RuntimeError('queue unavailable')
+        self.statuses[deployment_data['deployment_id']] = 'queued'
+
+    def get_deployment_status(self, deployment_id):
+        return {'status': self.statuses.get(deployment_id, 'not_found')}
+
+
+@pytest.fixture
+def services(monkeypatch):
+    mongodb_service = FakeMongoDBService()
+    deployment_queue = FakeDeploymentQueue()
+    monkeypatch.setattr(app, 'mongodb_service', mongodb_service)
+    monkeypatch.setattr(app, 'deployment_queue', deployment_queue)
+    monkeypatch.setattr(app, '_resolve_head', lambda repo_url: 'a' * 40)
+    return mongodb_service, deployment_queue
+
+
+def deploy(repository='https://github.com/user/repo', headers=None):
+    with app.app.test_client() as client:
+        return client.post('/deploy', json={'email': 'user@example.com', 'repository': repository},
+                           headers=headers or {})
+
+
+def test_duplicate_is_coalesced_while_in_flight(services):
+    _, deployment_queue = services
+    first = deploy().json
+    deployment_queue.statuses[first['deployment_id']] = 'processing'
+
+    second = deploy().json
+
+    assert second['deployment_id'] == first['deployment_id']
+    assert second['status'] == 'processing'
+    assert second['message'] == 'Deployment request already received'
+
+
+def test_finished_deployment_key_is_taken_over(services):
+    mongodb_service, deployment_queue = services
+    first = deploy().json
+    deployment_queue.statuses[first['deployment_id']] = 'failed'
+
+    second = deploy().json
+
+    assert second['deployment_id'] != first['deployment_id']
+    assert list(mongodb_service.keys.values()) == [second['deployment_id']]
+
+
+def test_untracked_deployment_key_is_taken_over(services):
+    _, deployment_queue = services
+    first = deploy().json
+    # The API restarted, so the queue no longer knows the deployment
+    deployment_queue.statuses.clear()
+
+    second = deploy().json
+
+    assert second['deployment_id'] != first['deployment_id']
+
+
+def test_header_key_takes_precedence_over_content(services):
+    _, deployment_queue = services
+    headers = {'Idempotency-Key': 'retry-1'}
+    first = deploy(headers=headers).json
+    deployment_queue.statuses[first['deployment_id']] = 'completed'
+
+    retry = deploy('https://github.com/user/other', headers=headers).json
+    fresh = deploy().json
+
+    assert retry['deployment_id'] == first['deployment_id']
+    assert retry['status'] == 'completed'
+    assert fresh['deployment_id'] != first['deployment_id']
+
+
+def test_key_is_released_when_enqueueing_fails(services):
+    mongodb_service, deployment_queue = services
+    deployment_queue.fail = True
+
+    response = deploy()
+
+    assert response.status_code == 500
+    assert mongodb_service.keys == {}
+    assert app.pending_deployments == set()
+
+
+def test_invalid_repository_is_rejected(services):
+    mongodb_service, _ = services
+
+    response = deploy('--upload-pack=touch /tmp/probe')
+
+    assert response.status_code == 400
+    assert mongodb_service.keys == {}
+
+
+def test_upload_hash_rewinds_stream():
+    content = b'PK\x03\x04 project archive'
+    upload = FileStorage(stream=io.BytesIO(content), filename='project.zip')
+
+    assert app._hash_upload(upload) == hashlib.sha256(content).hexdigest()
+    assert upload.stream.read() == content
+
+
+class FakeCollection:
+    def __init__(self):
+        self.documents = []
+
+    def insert_one(self, document):
+        if self.find_one({'key': document['key']}):
+            raise DuplicateKeyError('duplicate key')
+        self.documents.append(document)
+
+    def find_one(self, query):
+        return next((d for d in self.documents if all(d.get(k) == v for k, v in query.items())), None)
+
+    def delete_one(self, query):
+        document = self.find_one(query)
+        if document:
+            self.documents.remove(document)
+        return mock.Mock(deleted_count=1 if document else 0)
+
+
+def test_mongodb_claim_and_release_idempotency_key():
+    service = MongoDBService.__new__(MongoDBService)
+    service.idempotency_keys = FakeCollection()
+
+    assert service.claim_idempotency_key('key', 'first', 'user@example.com') is None
+    assert service.claim_idempotency_key('key', 'second', 'user@example.com') == 'first'
+    assert not service.release_idempotency_key('key', 'second')
+    assert service.release_idempotency_key('key', 'first')
+    assert service.claim_idempotency_key('key', 'second', 'user@example.com') is None
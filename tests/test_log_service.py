@@ -0,0 +1,120 @@
+# tests/test_log_service.py
+import threading
+
+from log_service import LogBuffer, LogService, read_spilled_log
+
+
+def make_buffer(tmp_path, max_lines=3, spill_batch=2):
+    return LogBuffer(str(tmp_path / 'deployment.log.gz'), str(tmp_path / 'deployment.cursor'),
+                     max_lines=max_lines, spill_batch=spill_batch)
+
+
+def test_evicted_lines_spill_to_disk(tmp_path):
+    buffer = make_buffer(tmp_path)
+    buffer.write(''.join(f'line {i}\n' for i in range(6)))
+
+    assert [line for _, line, _ in buffer.lines] == ['line 3', 'line 4', 'line 5']
+    assert read_spilled_log(buffer.spill_path) == ['line 0', 'line 1', 'line 2']
+
+
+def test_tail_spans_spilled_and_in_memory_lines(tmp_path):
+    buffer = make_buffer(tmp_path)
+    buffer.write(''.join(f'line {i}\n' for i in range(6)))
+
+    assert buffer.tail(2) == ['line 4', 'line 5']
+    assert buffer.tail(5) == ['line 1', 'line 2', 'line 3', 'line 4', 'line 5']
+    assert buffer.tail() == [f'line {i}' for i in range(6)]
+
+
+def test_close_persists_every_line(tmp_path):
+    buffer = make_buffer(tmp_path)
+    buffer.write(''.join(f'line {i}\n' for i in range(4)))
+    buffer.write('unterminated')
+    buffer.close()
+
+    assert read_spilled_log(buffer.spill_path) == [f'line {i}' for i in range(4)] + ['unterminated']
+
+
+def test_lines_and_characters_split_across_chunks(tmp_path):
+    buffer = make_buffer(tmp_path, max_lines=10)
+    encoded = 'café\n'.encode('utf-8')
+    buffer.write(b'hello wo')
+    buffer.write(b'rld\r\n' + encoded[:4])
+    buffer.write(encoded[4:])
+
+    assert buffer.tail() == ['hello world', 'café']
+
+
+def test_container_timestamps_are_stripped_and_recorded(tmp_path):
+    buffer = make_buffer(tmp_path, max_lines=1, spill_batch=1)
+    buffer.timestamped = True
+    buffer.write('2024-01-20T10:00:01.5Z first\n2024-01-20T10:00:02Z second\n')
+
+    assert buffer.tail() == ['first', 'second']
+    with open(buffer.cursor_path) as f:
+        assert f.read() == '2024-01-20T10:00:01.5Z'
+
+
+def test_follow_ends_when_buffer_closes(tmp_path):
+    buffer = make_buffer(tmp_path)
+    buffer.write('before\n')
+
+    def produce():
+        buffer.write('after\n')
+        buffer.close()
+
+    follower = buffer.follow(idle_timeout=5, poll_interval=0.05)
+    assert next(follower) == 'before'
+    threading.Timer(0.1, produce).start()
+
+    assert list(follower) == ['after']
+
+
+def test_follow_ends_after_idle_timeout(tmp_path):
+    buffer = make_buffer(tmp_path)
+    buffer.write('only\n')
+
+    assert list(buffer.follow(idle_timeout=0.1, poll_interval=0.05)) == ['only']
+
+
+def test_write_after_delete_is_dropped(tmp_path):
+    service = LogService(str(tmp_path))
+    service.open('deployment')
+    service.write('deployment', 'kept\n')
+    service.delete('deployment')
+
+    service.write('deployment', 'late\n')
+    service.close('deployment')
+
+    assert not service.has_logs('deployment')
+
+
+def test_tail_reads_spill_file_without_holding_the_lock(tmp_path, monkeypatch):
+    import log_service
+
+    buffer = make_buffer(tmp_path)
+    buffer.write(''.join(f'line {i}\n' for i in range(6)))
+    real_read = log_service.read_spilled_log
+    writer_finished = []
+
+    def read_while_writing(*args):
+        writer = threading.Thread(target=buffer.write, args=('concurrent\n',))
+        writer.start()
+        writer.join(timeout=1)
+        writer_finished.append(not writer.is_alive())
+        return real_read(*args)
+
+    monkeypatch.setattr(log_service, 'read_spilled_log', read_while_writing)
+
+    assert buffer.tail(5) == ['line 1', 'line 2', 'line 3', 'line 4', 'line 5']
+    assert writer_finished == [True]
+
+
+def test_tail_ignores_lines_spilled_after_the_snapshot(tmp_path):
+    buffer = make_buffer(tmp_path)
+    buffer.write(''.join(f'line {i}\n' for i in range(6)))
+    with buffer._condition:
+        snapshot = buffer._snapshot()
+    buffer.write('line 6\nline 7\n')
+
+    assert buffer._tail_from(snapshot, None) == [f'line {i}' for i in range(6)]
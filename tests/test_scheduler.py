@@ -0,0 +1,78 @@
+# tests/test_scheduler.py
+import hashlib
+import hmac
+from queue import Empty
+
+import pytest
+
+from scheduler import TenantScheduler, tenant_id
+
+
+def drain(scheduler):
+    """Pop every schedulable item, finishing each one straight away"""
+    order = []
+    while True:
+        try:
+            tenant, item = scheduler.get(timeout=0.01)
+        except Empty:
+            return order
+        order.append(item)
+        scheduler.task_done(tenant)
+
+
+def test_burst_does_not_starve_other_tenants():
+    scheduler = TenantScheduler({'paid': 3, 'free': 1}, {'paid': 5, 'free': 5})
+    for i in range(4):
+        scheduler.put('heavy@example.com', f'heavy-{i}')
+    scheduler.put('light@example.com', 'light-0')
+
+    assert drain(scheduler) == ['heavy-0', 'light-0', 'heavy-1', 'heavy-2', 'heavy-3']
+
+
+def test_weight_gives_paid_tier_a_larger_share():
+    scheduler = TenantScheduler({'paid': 3, 'free': 1}, {'paid': 5, 'free': 5})
+    for i in range(2):
+        scheduler.put('free@example.com', f'free-{i}')
+    for i in range(4):
+        scheduler.put('paid@example.com', f'paid-{i}', 'paid')
+
+    assert drain(scheduler) == ['free-0', 'paid-0', 'paid-1', 'paid-2', 'free-1', 'paid-3']
+
+
+def test_concurrent_builds_are_capped_per_tier():
+    scheduler = TenantScheduler({'paid': 3, 'free': 1}, {'paid': 2, 'free': 1})
+    scheduler.put('a@example.com', 'a-0')
+    scheduler.put('a@example.com', 'a-1')
+
+    assert scheduler.get(timeout=0.01) == ('a@example.com', 'a-0')
+    with pytest.raises(Empty):
+        scheduler.get(timeout=0.01)
+
+
+def test_task_done_releases_a_build_slot():
+    scheduler = TenantScheduler({'paid': 3, 'free': 1}, {'paid': 2, 'free': 1})
+    scheduler.put('a@example.com', 'a-0')
+    scheduler.put('a@example.com', 'a-1')
+    scheduler.get(timeout=0.01)
+
+    scheduler.task_done('a@example.com')
+
+    assert scheduler.get(timeout=0.01) == ('a@example.com', 'a-1')
+
+
+def test_unknown_tier_falls_back_to_default():
+    scheduler = TenantScheduler({'paid': 3, 'free': 1}, {'paid': 2, 'free': 1})
+    scheduler.put('a@example.com', 'a-0', 'enterprise')
+    scheduler.put('a@example.com', 'a-1', 'enterprise')
+
+    scheduler.get(timeout=0.01)
+    with pytest.raises(Empty):
+        scheduler.get(timeout=0.01)
+
+
+def test_tenant_id_is_keyed_and_stable():
+    email = 'user@example.com'
+
+    assert tenant_id(email) == tenant_id(email)
+    assert tenant_id(email) != hashlib.sha256(email.encode('utf-8')).hexdigest()[:16]
+    assert tenant_id(email) != hmac.new(b'', email.encode('utf-8'), hashlib.sha256).hexdigest()[:16]